@@ -3,14 +3,13 @@
 import json
 import logging
 import os
-import re
 import threading
 import subprocess
 import shlex
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from functools import lru_cache
-from io import BytesIO
+from io import BufferedReader, BytesIO
 from pathlib import Path
 from urllib.parse import unquote, urlparse
 from urllib.request import url2pathname
@@ -29,11 +28,13 @@ sh.setFormatter(fmt)
 LOGGER.addHandler(sh)
 
 
+@lru_cache(maxsize=128)
 def path_to_uri(path: _PathLikeStr) -> URI:
     """convert path to uri"""
     return Path(path).as_uri()
 
 
+@lru_cache(maxsize=128)
 def uri_to_path(uri: URI) -> _PathLikeStr:
     """convert uri to path"""
     return url2pathname(unquote(urlparse(uri).path))
@@ -58,6 +59,10 @@ class BaseHandler:
             return func(params)
 
 
+# compact separator, less bytes to write
+JSON_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+
 class RPCMessage(dict):
     """rpc message"""
 
@@ -84,7 +89,7 @@ class RPCMessage(dict):
         """dump rpc message to json text"""
 
         self["jsonrpc"] = "2.0"
-        dumped = json.dumps(self)
+        dumped = JSON_ENCODER.encode(self)
         if as_bytes:
             return dumped.encode()
         return dumped
@@ -121,15 +126,20 @@ class HeaderError(ValueError):
 
 def wrap_rpc(content: bytes) -> bytes:
     """wrap content as rpc body"""
-    header = b"Content-Length: %d\r\n" % len(content)
-    return b"%s\r\n%s" % (header, content)
+    return b"Content-Length: %d\r\n\r\n%s" % (len(content), content)
+
+
+CONTENT_LENGTH_PREFIX = b"Content-Length: "
 
 
 @lru_cache(maxsize=512)
 def get_content_length(header: bytes) -> int:
     for line in header.splitlines():
-        if match := re.match(rb"Content-Length: (\d+)", line):
-            return int(match.group(1))
+        if line.startswith(CONTENT_LENGTH_PREFIX):
+            try:
+                return int(line[len(CONTENT_LENGTH_PREFIX) :])
+            except ValueError as err:
+                raise HeaderError(f"invalid 'Content-Length': {line!r}") from err
 
     raise HeaderError("unable get 'Content-Length'")
 
@@ -167,11 +177,17 @@ class PopenOptions:
 class StandardIO(Transport):
     """StandardIO Transport implementation"""
 
+    READ_BUFFER_SIZE = 65536
+
     def __init__(self, command: list):
         self.command = command
 
         self._process: subprocess.Popen = None
+        self._stdout: BufferedReader = None
+        self._stderr: BufferedReader = None
         self._run_event = threading.Event()
+        # messages written from several threads, keep frames whole
+        self._write_lock = threading.Lock()
 
         # make execution next to '(self._run_event).wait()' blocked
         self._run_event.clear()
@@ -190,10 +206,16 @@ class StandardIO(Transport):
             stderr=subprocess.PIPE,
             env=options.env,
             cwd=options.cwd,
-            shell=True,
             bufsize=0,
             startupinfo=STARTUPINFO,
         )
+        # pipe opened unbuffered, 'readline()' on raw pipe read byte per byte
+        self._stdout = BufferedReader(
+            self._process.stdout, buffer_size=self.READ_BUFFER_SIZE
+        )
+        self._stderr = BufferedReader(
+            self._process.stderr, buffer_size=self.READ_BUFFER_SIZE
+        )
 
         # ready to call 'Popen()' object
         self._run_event.set()
@@ -210,13 +232,13 @@ class StandardIO(Transport):
     @property
     def stdout(self):
         if self.is_running():
-            return self._process.stdout
+            return self._stdout
         return BytesIO()
 
     @property
     def stderr(self):
         if self.is_running():
-            return self._process.stderr
+            return self._stderr
         return BytesIO()
 
     def listen_stderr(self):
@@ -241,13 +263,16 @@ class StandardIO(Transport):
             self._process.wait()
             # set to None to release 'Popen()' object from memory
             self._process = None
+            self._stdout = None
+            self._stderr = None
 
     def write(self, data: bytes):
         self._run_event.wait()
 
         prepared_data = wrap_rpc(data)
-        self.stdin.write(prepared_data)
-        self.stdin.flush()
+        with self._write_lock:
+            self.stdin.write(prepared_data)
+            self.stdin.flush()
 
     def read(self):
         self._run_event.wait()
@@ -274,21 +299,11 @@ class StandardIO(Transport):
             LOGGER.exception("header: %s", temp_header.getvalue())
             raise err
 
-        # in some case where received content less than content_length
-        temp_content = BytesIO()
-        n_content = 0
-        while True:
-            if n_content < content_length:
-                unread_length = content_length - n_content
-                if chunk := self.stdout.read(unread_length):
-                    n = temp_content.write(chunk)
-                    n_content += n
-                else:
-                    raise EOFError("stdout closed")
-            else:
-                break
+        # buffered 'read()' block until 'content_length' received or EOF
+        content = self.stdout.read(content_length)
+        if len(content) < content_length:
+            raise EOFError("stdout closed")
 
-        content = temp_content.getvalue()
         return content
 
 
@@ -300,12 +315,18 @@ class Client:
         self._request_map_lock = threading.Lock()
 
         self._request_map = {}
+        # latest request id for each method
+        self._method_map = {}
+        # params of in flight request for each method
+        self._inflight_params = {}
         self._canceled_requests = set()
         self._temp_request_id = -1
 
     def _reset_state(self):
         with self._request_map_lock:
             self._request_map = {}
+            self._method_map = {}
+            self._inflight_params = {}
             self._canceled_requests = set()
             self._temp_request_id = -1
 
@@ -399,31 +420,62 @@ class Client:
             LOGGER.debug(err, exc_info=True)
 
     def handle_response(self, message: RPCMessage):
+        req_id = message["id"]
         with self._request_map_lock:
-            method = self._request_map.pop(message["id"], "unknown")
+            method = self._request_map.pop(req_id, "unknown")
+            if self._method_map.get(method) == req_id:
+                del self._method_map[method]
+                self._inflight_params.pop(method, None)
 
             # check if request canceled
-            if message["id"] in self._canceled_requests:
-                self._canceled_requests.remove(message["id"])
+            if req_id in self._canceled_requests:
+                self._canceled_requests.remove(req_id)
                 return
 
-            try:
-                self.handler.handle(method, message)
-            except Exception as err:
-                LOGGER.debug(err, exc_info=True)
+        # handle outside lock, handler may send another request
+        try:
+            self.handler.handle(method, message)
+        except Exception as err:
+            LOGGER.debug(err, exc_info=True)
 
-    def send_request(self, method: str, params: dict):
+    def _cancel_request(self, method: str):
+        # older requests already canceled when latest request sent
+        if (req_id := self._method_map.pop(method, None)) is None:
+            return
+
+        self._inflight_params.pop(method, None)
+        self._canceled_requests.add(req_id)
+        # let server drop the work, its result will be discarded
+        self.send_message(RPCMessage.notification("$/cancelRequest", {"id": req_id}))
+
+    def cancel_request(self, method: str):
+        """cancel in flight request for method"""
         with self._request_map_lock:
-            # cancel previous request
-            for req_id, meth in self._request_map.items():
-                if meth == method:
-                    self._canceled_requests.add(req_id)
+            self._cancel_request(method)
+
+    def send_request(self, method: str, params: dict) -> Optional[int]:
+        """send request, return request id or None if same request in flight"""
+        with self._request_map_lock:
+            # same request still waiting response
+            if self._inflight_params.get(method) == params:
+                LOGGER.debug("request %r already in flight", method)
+                return None
+
+            self._cancel_request(method)
 
             req_id = self.new_request_id()
-            self.send_message(RPCMessage.request(req_id, method, params))
             self._request_map[req_id] = method
+            self._method_map[method] = req_id
+            self._inflight_params[method] = params
+            self.send_message(RPCMessage.request(req_id, method, params))
+            return req_id
 
     def send_notification(self, method: str, params: dict):
+        with self._request_map_lock:
+            # notification may change document state, in flight result
+            # no longer valid for a new request
+            self._inflight_params = {}
+
         self.send_message(RPCMessage.notification(method, params))
 
     def send_response(
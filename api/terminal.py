@@ -1,6 +1,5 @@
 """terminal helper"""
 
-import os
 import shlex
 import subprocess
 import threading
@@ -8,13 +7,7 @@ import time
 from dataclasses import dataclass
 from typing import List, Any
 
-
-if os.name == "nt":
-    # if on Windows, hide process window
-    STARTUPINFO = subprocess.STARTUPINFO()
-    STARTUPINFO.dwFlags |= subprocess.SW_HIDE | subprocess.STARTF_USESHOWWINDOW
-else:
-    STARTUPINFO = None
+from . import STARTUPINFO
 
 
 @dataclass
@@ -38,7 +31,6 @@ def exec_cmd_nobuffer(command: List[str], **kwargs: Any) -> int:
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         startupinfo=STARTUPINFO,
-        bufsize=0,
         cwd=kwargs.get("cwd"),
     )
 
@@ -0,0 +1,39 @@
+"""sublime view helper shared between plugin modules"""
+
+from pathlib import Path
+from typing import Dict
+
+import sublime
+
+# view id mapped document context
+VALID_CONTEXT_CACHE: Dict[int, bool] = {}
+
+
+def valid_context(view: sublime.View, point: int):
+    if point:
+        return view.match_selector(point, "source.go")
+
+    # document context only changed if syntax changed
+    view_id = view.id()
+    if (valid := VALID_CONTEXT_CACHE.get(view_id)) is None:
+        valid = view.match_selector(0, "source.go")
+        VALID_CONTEXT_CACHE[view_id] = valid
+
+    return valid
+
+
+def clear_valid_context(view: sublime.View):
+    VALID_CONTEXT_CACHE.pop(view.id(), None)
+
+
+def get_workspace_path(view: sublime.View) -> str:
+    window = view.window()
+    file_name = view.file_name()
+
+    # deepest folder contain file
+    workspace_path = ""
+    for folder in window.folders():
+        if len(folder) > len(workspace_path) and file_name.startswith(folder):
+            workspace_path = folder
+
+    return workspace_path or str(Path(file_name).parent)
@@ -2,12 +2,11 @@
 
 import logging
 import threading
-from collections import defaultdict
 from dataclasses import dataclass
 from functools import wraps
-from io import StringIO
+from itertools import accumulate
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 
 import sublime
@@ -15,6 +14,7 @@ import sublime_plugin
 from sublime import HoverZone
 
 from . import api
+from .api.view import valid_context, clear_valid_context, get_workspace_path
 
 LOGGER = logging.getLogger(__name__)
 # LOGGER.setLevel(logging.DEBUG)
@@ -27,36 +27,33 @@ LOGGER.addHandler(sh)
 KIND_PATH = (sublime.KIND_ID_VARIABLE, "p", "")
 KIND_VALUE = (sublime.KIND_ID_VARIABLE, "u", "")
 KIND_TEXT = (sublime.KIND_ID_VARIABLE, "t", "")
-COMPLETION_KIND_MAP = defaultdict(
-    lambda _: sublime.KIND_AMBIGUOUS,
-    {
-        1: KIND_TEXT,  # text
-        2: sublime.KIND_FUNCTION,  # method
-        3: sublime.KIND_FUNCTION,  # function
-        4: sublime.KIND_FUNCTION,  # constructor
-        5: sublime.KIND_VARIABLE,  # field
-        6: sublime.KIND_VARIABLE,  # variable
-        7: sublime.KIND_TYPE,  # class
-        8: sublime.KIND_TYPE,  # interface
-        9: sublime.KIND_NAMESPACE,  # module
-        10: sublime.KIND_VARIABLE,  # property
-        11: KIND_VALUE,  # unit
-        12: KIND_VALUE,  # value
-        13: sublime.KIND_NAMESPACE,  # enum
-        14: sublime.KIND_KEYWORD,  # keyword
-        15: sublime.KIND_SNIPPET,  # snippet
-        16: KIND_VALUE,  # color
-        17: KIND_PATH,  # file
-        18: sublime.KIND_NAVIGATION,  # reference
-        19: KIND_PATH,  # folder
-        20: sublime.KIND_VARIABLE,  # enum member
-        21: sublime.KIND_VARIABLE,  # constant
-        22: sublime.KIND_TYPE,  # struct
-        23: sublime.KIND_MARKUP,  # event
-        24: sublime.KIND_MARKUP,  # operator
-        25: sublime.KIND_TYPE,  # type parameter
-    },
-)
+COMPLETION_KIND_MAP = {
+    1: KIND_TEXT,  # text
+    2: sublime.KIND_FUNCTION,  # method
+    3: sublime.KIND_FUNCTION,  # function
+    4: sublime.KIND_FUNCTION,  # constructor
+    5: sublime.KIND_VARIABLE,  # field
+    6: sublime.KIND_VARIABLE,  # variable
+    7: sublime.KIND_TYPE,  # class
+    8: sublime.KIND_TYPE,  # interface
+    9: sublime.KIND_NAMESPACE,  # module
+    10: sublime.KIND_VARIABLE,  # property
+    11: KIND_VALUE,  # unit
+    12: KIND_VALUE,  # value
+    13: sublime.KIND_NAMESPACE,  # enum
+    14: sublime.KIND_KEYWORD,  # keyword
+    15: sublime.KIND_SNIPPET,  # snippet
+    16: KIND_VALUE,  # color
+    17: KIND_PATH,  # file
+    18: sublime.KIND_NAVIGATION,  # reference
+    19: KIND_PATH,  # folder
+    20: sublime.KIND_VARIABLE,  # enum member
+    21: sublime.KIND_VARIABLE,  # constant
+    22: sublime.KIND_TYPE,  # struct
+    23: sublime.KIND_MARKUP,  # event
+    24: sublime.KIND_MARKUP,  # operator
+    25: sublime.KIND_TYPE,  # type parameter
+}
 
 
 @dataclass
@@ -65,15 +62,11 @@ class TextChange:
     new_text: str
     cursor_move: int = 0
 
-    def moved_region(self, move: int) -> sublime.Region:
-        return sublime.Region(self.region.a + move, self.region.b + move)
-
-
-DOCUMENT_CHAGE_EVENT = threading.Event()
-
 
 class GotoolsApplyTextChangesCommand(sublime_plugin.TextCommand):
     def run(self, edit: sublime.Edit, changes: List[dict]):
+        # line start point, valid until changes applied
+        self._line_points: Dict[int, int] = {}
         text_changes = [self.to_text_change(c) for c in changes]
         current_sel = list(self.view.sel())
         try:
@@ -81,14 +74,13 @@ class GotoolsApplyTextChangesCommand(sublime_plugin.TextCommand):
             self.relocate_selection(current_sel, text_changes)
         finally:
             self.view.show(self.view.sel(), show_surrounds=False)
-            DOCUMENT_CHAGE_EVENT.set()
 
     def to_text_change(self, change: dict) -> TextChange:
         start = change["range"]["start"]
         end = change["range"]["end"]
 
-        start_point = self.view.text_point(start["line"], start["character"])
-        end_point = self.view.text_point(end["line"], end["character"])
+        start_point = self.text_point(start["line"], start["character"])
+        end_point = self.text_point(end["line"], end["character"])
 
         region = sublime.Region(start_point, end_point)
         new_text = change["newText"]
@@ -96,13 +88,39 @@ class GotoolsApplyTextChangesCommand(sublime_plugin.TextCommand):
 
         return TextChange(region, new_text, cursor_move)
 
+    def text_point(self, row: int, col: int) -> int:
+        if (line_point := self._line_points.get(row)) is None:
+            line_point = self.view.text_point(row, 0)
+            self._line_points[row] = line_point
+
+        return line_point + col
+
     def apply(self, edit: sublime.Edit, text_changes: List[TextChange]):
-        cursor_move = 0
-        for change in text_changes:
-            replaced_region = change.moved_region(cursor_move)
-            self.view.erase(edit, replaced_region)
-            self.view.insert(edit, replaced_region.a, change.new_text)
-            cursor_move += change.cursor_move
+        # apply from bottom to top, so region of upper changes not moved
+        for change in reversed(self.coalesce(text_changes)):
+            self.view.replace(edit, change.region, change.new_text)
+
+    @staticmethod
+    def coalesce(text_changes: List[TextChange]) -> List[TextChange]:
+        """sort changes and merge adjacent changes into single change"""
+
+        coalesced = []
+        # insertion sorted before replacement at same point, so it merged into
+        # the replacement, stable sort keep insertion order
+        for change in sorted(
+            text_changes, key=lambda c: (c.region.begin(), c.region.end())
+        ):
+            if coalesced and coalesced[-1].region.end() == change.region.begin():
+                prev = coalesced[-1]
+                coalesced[-1] = TextChange(
+                    sublime.Region(prev.region.begin(), change.region.end()),
+                    prev.new_text + change.new_text,
+                    prev.cursor_move + change.cursor_move,
+                )
+            else:
+                coalesced.append(change)
+
+        return coalesced
 
     def relocate_selection(
         self, selections: List[sublime.Region], changes: List[TextChange]
@@ -129,43 +147,62 @@ class UnbufferedDocument:
         self.text = self._path.read_text()
 
     def apply_text_changes(self, changes: List[dict]):
-        try:
-            self._apply_text_changes(changes)
-        finally:
-            DOCUMENT_CHAGE_EVENT.set()
-
-    def _apply_text_changes(self, changes: List[dict]):
+        text = self.text
+        # all change ranges refer to the text before any change applied
+        line_starts = [0, *accumulate(len(line) + 1 for line in text.split("\n"))]
+        last_line = len(line_starts) - 2
+
+        def get_offset(line: int, character: int) -> int:
+            if line > last_line:
+                return len(text)
+            # character beyond line length points to end of line
+            return min(line_starts[line] + character, line_starts[line + 1] - 1)
+
+        replacements = []
         for change in changes:
             try:
                 start = change["range"]["start"]
                 end = change["range"]["end"]
                 new_text = change["newText"]
 
-                start_line, start_character = start["line"], start["character"]
-                end_line, end_character = end["line"], end["character"]
+                start_offset = get_offset(start["line"], start["character"])
+                end_offset = get_offset(end["line"], end["character"])
 
             except KeyError as err:
                 raise Exception(f"invalid params {err}") from err
 
-            lines = self.text.split("\n")
-            temp_lines = []
+            replacements.append((start_offset, end_offset, new_text))
+
+        # build new text in single pass, insertion sorted before replacement
+        # at same point, stable sort keep insertion order
+        temp_text = []
+        cursor = 0
+        for start_offset, end_offset, new_text in sorted(
+            replacements, key=lambda r: (r[0], r[1])
+        ):
+            if start_offset < cursor:
+                raise Exception(f"overlapping change at offset {start_offset}")
 
-            # pre change line
-            temp_lines.extend(lines[:start_line])
-            # line changed
-            prefix = lines[start_line][:start_character]
-            suffix = lines[end_line][end_character:]
-            line = f"{prefix}{new_text}{suffix}"
-            temp_lines.append(line)
-            # post change line
-            temp_lines.extend(lines[end_line + 1 :])
+            temp_text.append(text[cursor:start_offset])
+            temp_text.append(new_text)
+            cursor = end_offset
 
-            self.text = "\n".join(temp_lines)
+        temp_text.append(text[cursor:])
+        self.text = "".join(temp_text)
 
     def save(self):
         self._path.write_text(self.text)
 
 
+def build_completion(completion: dict) -> sublime.CompletionItem:
+    return sublime.CompletionItem.snippet_completion(
+        trigger=completion["filterText"],
+        snippet=completion["textEdit"]["newText"],
+        annotation=completion.get("detail", ""),
+        kind=COMPLETION_KIND_MAP.get(completion["kind"], sublime.KIND_AMBIGUOUS),
+    )
+
+
 class BufferedDocument:
     def __init__(self, view: sublime.View):
         self.view = view
@@ -173,6 +210,8 @@ class BufferedDocument:
 
         self.file_name = self.view.file_name()
         self._cached_completion = None
+        self._completion_lock = threading.Lock()
+        self._highlight_fingerprint = None
 
         self._add_view_settings()
 
@@ -203,30 +242,18 @@ class BufferedDocument:
         self.view.run_command("markdown_popup", {"text": text, "point": point})
 
     def show_completion(self, items: List[dict]):
-        def convert_kind(kind_num: int):
-            return COMPLETION_KIND_MAP[kind_num]
-
-        def build_completion(completion: dict):
-            trigger = completion["filterText"]
-            text = completion["textEdit"]["newText"]
-            annotation = completion.get("detail", "")
-            kind = convert_kind(completion["kind"])
-
-            return sublime.CompletionItem.snippet_completion(
-                trigger=trigger, snippet=text, annotation=annotation, kind=kind
-            )
-
-        self._cached_completion = [build_completion(c) for c in items]
+        completion = [build_completion(c) for c in items]
+        with self._completion_lock:
+            self._cached_completion = completion
         self._trigger_completion()
 
     @property
-    def cached_completion(self):
-        temp = self._cached_completion
-        self._cached_completion = None
-        return temp
-
-    def completion_ready(self) -> bool:
-        return self._cached_completion is not None
+    def cached_completion(self) -> Optional[List[sublime.CompletionItem]]:
+        """pop cached completion, None if completion not ready"""
+        with self._completion_lock:
+            temp = self._cached_completion
+            self._cached_completion = None
+            return temp
 
     def _trigger_completion(self):
         LOGGER.debug("trigger completion")
@@ -246,6 +273,21 @@ class BufferedDocument:
         self.view.run_command("gotools_apply_text_changes", {"changes": changes})
 
     def highlight_text(self, diagnostics: List[dict]):
+        def get_range(diagnostic):
+            start = diagnostic["range"]["start"]
+            end = diagnostic["range"]["end"]
+            return (start["line"], start["character"], end["line"], end["character"])
+
+        # server may republish same diagnostics for unchanged buffer
+        fingerprint = (
+            self.view.change_count(),
+            tuple(get_range(d) for d in diagnostics),
+        )
+        if fingerprint == self._highlight_fingerprint:
+            return
+
+        self._highlight_fingerprint = fingerprint
+
         def get_region(diagnostic):
             start = diagnostic["range"]["start"]
             end = diagnostic["range"]["end"]
@@ -274,6 +316,8 @@ class DiagnosticPanel:
 
     def __init__(self, window: sublime.Window):
         self.window = window
+        # file name mapped (diagnostics, rendered message)
+        self._rendered: Dict[str, Tuple[List[dict], str]] = {}
 
     def _create_panel(self):
         self.panel = self.window.create_output_panel(self.OUTPUT_PANEL_NAME)
@@ -283,25 +327,29 @@ class DiagnosticPanel:
     def set_content(self, diagnostics_map: Dict[str, List[dict]]):
         """set content with document mapped diagnostics"""
 
-        message_buffer = StringIO()
-
-        def build_message(file_name: str, diagnostics: Dict[str, List[dict]]):
-            for diagnostic in diagnostics:
-                short_name = Path(file_name).name
-                row = diagnostic["range"]["start"]["line"]
-                col = diagnostic["range"]["start"]["character"]
-                message = diagnostic["message"]
-                source = diagnostic.get("source", "")
+        def build_message(short_name: str, diagnostic: dict) -> str:
+            row = diagnostic["range"]["start"]["line"]
+            col = diagnostic["range"]["start"]["character"]
+            message = diagnostic["message"]
+            source = diagnostic.get("source", "")
 
-                # natural line index start with 1
-                row += 1
+            # natural line index start with 1
+            row += 1
 
-                message_buffer.write(
-                    f"{short_name}:{row}:{col}: {message} ({source})\n"
-                )
+            return f"{short_name}:{row}:{col}: {message} ({source})\n"
 
+        rendered = {}
         for file_name, diagnostics in diagnostics_map.items():
-            build_message(file_name, diagnostics)
+            # diagnostics list replaced on publish, same list already rendered
+            if (cache := self._rendered.get(file_name)) and cache[0] is diagnostics:
+                rendered[file_name] = cache
+                continue
+
+            short_name = Path(file_name).name
+            message = "".join(build_message(short_name, d) for d in diagnostics)
+            rendered[file_name] = (diagnostics, message)
+
+        self._rendered = rendered
 
         if not self.panel:
             self._create_panel()
@@ -317,7 +365,7 @@ class DiagnosticPanel:
 
         self.panel.run_command(
             "append",
-            {"characters": message_buffer.getvalue()},
+            {"characters": "".join(message for _, message in rendered.values())},
         )
 
     def show(self) -> None:
@@ -357,6 +405,12 @@ class GoplsHandler(api.BaseHandler):
         self.definition_target: Optional[BufferedDocument] = None
         self.rename_target: Optional[BufferedDocument] = None
 
+        # completion result cache
+        self._completion_lock = threading.Lock()
+        # (request id, completion key) of in flight completion request
+        self._completion_request: Optional[Tuple[int, tuple]] = None
+        self._completion_cache: Optional[Tuple[tuple, List[dict]]] = None
+
     def _reset_state(self):
         self.working_documents = {}
         self._initializing = False
@@ -370,6 +424,9 @@ class GoplsHandler(api.BaseHandler):
         self.definition_target = None
         self.rename_target = None
 
+        self._completion_request = None
+        self._completion_cache = None
+
     initialized_event = threading.Event()
 
     def wait_initialized(func):
@@ -446,6 +503,14 @@ class GoplsHandler(api.BaseHandler):
         self._initialized = True
         self.initialized_event.set()
 
+    @staticmethod
+    def _text_document_position(document: BufferedDocument, row: int, col: int) -> dict:
+        """build TextDocumentPositionParams"""
+        return {
+            "position": {"character": col, "line": row},
+            "textDocument": {"uri": document.document_uri()},
+        }
+
     def handle_window_logmessage(self, params: dict):
         print(params["message"])
 
@@ -526,14 +591,11 @@ class GoplsHandler(api.BaseHandler):
     @wait_initialized
     def textdocument_hover(self, file_name, row, col):
         if document := self.working_documents.get(file_name):
+            self.hover_target = document
             self.client.send_request(
                 "textDocument/hover",
-                {
-                    "position": {"character": col, "line": row},
-                    "textDocument": {"uri": document.document_uri()},
-                },
+                self._text_document_position(document, row, col),
             )
-            self.hover_target = document
 
     def handle_textdocument_hover(self, params: dict):
         if err := params.get("error"):
@@ -552,15 +614,28 @@ class GoplsHandler(api.BaseHandler):
     @wait_initialized
     def textdocument_completion(self, file_name, row, col):
         if document := self.working_documents.get(file_name):
-            self.client.send_request(
-                "textDocument/completion",
-                {
-                    "position": {"character": col, "line": row},
-                    "textDocument": {"uri": document.document_uri()},
-                },
-            )
             self.completion_target = document
 
+            key = (file_name, document.view.change_count(), row, col)
+
+            # record request before its response handled in reader thread
+            with self._completion_lock:
+                # document and position unchanged since last completion
+                if (cache := self._completion_cache) and cache[0] == key:
+                    # in flight result is for other position
+                    self.client.cancel_request("textDocument/completion")
+                    self._completion_request = None
+                    document.show_completion(cache[1])
+                    return
+
+                req_id = self.client.send_request(
+                    "textDocument/completion",
+                    self._text_document_position(document, row, col),
+                )
+                # None if same request still in flight
+                if req_id is not None:
+                    self._completion_request = (req_id, key)
+
     def handle_textdocument_completion(self, params: dict):
         if err := params.get("error"):
             print(err["message"])
@@ -571,7 +646,17 @@ class GoplsHandler(api.BaseHandler):
             except Exception:
                 pass
             else:
-                self.completion_target.show_completion(items)
+                with self._completion_lock:
+                    request = self._completion_request
+                    # superseded by newer request or cached result
+                    if not (request and request[0] == params["id"]):
+                        return
+
+                    # incomplete result must be requested again
+                    if not result.get("isIncomplete"):
+                        self._completion_cache = (request[1], items)
+
+                    self.completion_target.show_completion(items)
 
     def handle_textdocument_publishdiagnostics(self, params: dict):
         file_name = api.uri_to_path(params["uri"])
@@ -588,6 +673,7 @@ class GoplsHandler(api.BaseHandler):
     @wait_initialized
     def textdocument_formatting(self, file_name):
         if document := self.working_documents.get(file_name):
+            self.formatting_target = document
             self.client.send_request(
                 "textDocument/formatting",
                 {
@@ -595,7 +681,6 @@ class GoplsHandler(api.BaseHandler):
                     "textDocument": {"uri": document.document_uri()},
                 },
             )
-            self.formatting_target = document
 
     def handle_textdocument_formatting(self, params: dict):
         if error := params.get("error"):
@@ -608,6 +693,7 @@ class GoplsHandler(api.BaseHandler):
         self, file_name, start_row, start_col, end_row, end_col
     ):
         if document := self.working_documents.get(file_name):
+            self.codeaction_target = document
             self.client.send_request(
                 "textDocument/codeAction",
                 {
@@ -622,7 +708,6 @@ class GoplsHandler(api.BaseHandler):
                     "textDocument": {"uri": document.document_uri()},
                 },
             )
-            self.codeaction_target = document
 
     def handle_textdocument_codeaction(self, params: dict):
         if error := params.get("error"):
@@ -655,17 +740,27 @@ class GoplsHandler(api.BaseHandler):
         )
 
     def _apply_edit(self, edit: dict):
+        # a file may be changed more than once in a workspace edit
+        unbuffered_documents: Dict[str, UnbufferedDocument] = {}
+
         for document_changes in edit["documentChanges"]:
             file_name = api.uri_to_path(document_changes["textDocument"]["uri"])
             changes = document_changes["edits"]
 
-            DOCUMENT_CHAGE_EVENT.clear()
-            document = self.working_documents.get(
-                file_name, UnbufferedDocument(file_name)
-            )
+            if document := self.working_documents.get(file_name):
+                # 'view.run_command()' return after text command finished,
+                # changes already applied before saved
+                document.apply_text_changes(changes)
+                document.save()
+                continue
+
+            if not (document := unbuffered_documents.get(file_name)):
+                document = UnbufferedDocument(file_name)
+                unbuffered_documents[file_name] = document
+
             document.apply_text_changes(changes)
-            # wait until changes applied
-            DOCUMENT_CHAGE_EVENT.wait()
+
+        for document in unbuffered_documents.values():
             document.save()
 
     def handle_workspace_applyedit(self, params: dict) -> dict:
@@ -688,14 +783,11 @@ class GoplsHandler(api.BaseHandler):
     @wait_initialized
     def textdocument_definition(self, file_name, row, col):
         if document := self.working_documents.get(file_name):
+            self.definition_target = document
             self.client.send_request(
                 "textDocument/definition",
-                {
-                    "position": {"character": col, "line": row},
-                    "textDocument": {"uri": document.document_uri()},
-                },
+                self._text_document_position(document, row, col),
             )
-            self.definition_target = document
 
     def _open_locations(self, locations: List[dict]):
         current_view = self.definition_target.view
@@ -742,25 +834,17 @@ class GoplsHandler(api.BaseHandler):
     @wait_initialized
     def textdocument_preparerename(self, file_name, row, col):
         if document := self.working_documents.get(file_name):
+            self.rename_target = document
             self.client.send_request(
                 "textDocument/prepareRename",
-                {
-                    "position": {"character": col, "line": row},
-                    "textDocument": {"uri": document.document_uri()},
-                },
+                self._text_document_position(document, row, col),
             )
-            self.rename_target = document
 
     @wait_initialized
     def textdocument_rename(self, new_name, row, col):
-        self.client.send_request(
-            "textDocument/rename",
-            {
-                "newName": new_name,
-                "position": {"character": col, "line": row},
-                "textDocument": {"uri": self.rename_target.document_uri()},
-            },
-        )
+        params = self._text_document_position(self.rename_target, row, col)
+        params["newName"] = new_name
+        self.client.send_request("textDocument/rename", params)
 
     def _input_rename(self, symbol_location: dict):
         start = symbol_location["range"]["start"]
@@ -809,21 +893,6 @@ def plugin_unloaded():
         HANDLER.terminate()
 
 
-def valid_context(view: sublime.View, point: int):
-    return view.match_selector(point, "source.go")
-
-
-def get_workspace_path(view: sublime.View) -> str:
-    window = view.window()
-    file_name = view.file_name()
-
-    if folders := [
-        folder for folder in window.folders() if file_name.startswith(folder)
-    ]:
-        return max(folders)
-    return str(Path(file_name).parent)
-
-
 class ViewEventListener(sublime_plugin.ViewEventListener):
     def __init__(self, view: sublime.View):
         super().__init__(view)
@@ -837,9 +906,14 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
         file_name = self.view.file_name()
         row, col = self.view.rowcol(point)
 
-        threading.Thread(
-            target=self._on_hover, args=(self.view, file_name, row, col)
-        ).start()
+        view = self.view
+        if HANDLER.ready():
+            sublime.set_timeout_async(lambda: self._on_hover(view, file_name, row, col))
+        else:
+            # server startup may block until initialized, keep async worker free
+            threading.Thread(
+                target=self._on_hover, args=(view, file_name, row, col)
+            ).start()
 
     def _on_hover(self, view, file_name, row, col):
         # check if server available
@@ -866,6 +940,9 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
             pass
 
     prev_completion_loc = 0
+    # wait typing pause before request completion
+    completion_delay_ms = 30
+    completion_request_count = 0
 
     def on_query_completions(
         self, prefix: str, locations: List[int]
@@ -879,7 +956,9 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
         if not valid_context(self.view, point):
             return
 
-        if (document := HANDLER.completion_target) and document.completion_ready():
+        if (document := HANDLER.completion_target) and (
+            cache := document.cached_completion
+        ) is not None:
             word = self.view.word(self.prev_completion_loc)
             # point unchanged
             if point == self.prev_completion_loc:
@@ -890,7 +969,7 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
             else:
                 show = False
 
-            if (cache := document.cached_completion) and show:
+            if cache and show:
                 LOGGER.debug("show auto_complete")
                 return sublime.CompletionList(
                     cache, flags=sublime.INHIBIT_WORD_COMPLETIONS
@@ -904,13 +983,21 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
         file_name = self.view.file_name()
         row, col = self.view.rowcol(point)
 
-        threading.Thread(
-            target=self._on_query_completions, args=(self.view, file_name, row, col)
-        ).start()
+        self.completion_request_count += 1
+        request_count = self.completion_request_count
+
+        sublime.set_timeout_async(
+            lambda: self._on_query_completions(request_count, file_name, row, col),
+            self.completion_delay_ms,
+        )
 
         self.view.run_command("hide_auto_complete")
 
-    def _on_query_completions(self, view, file_name, row, col):
+    def _on_query_completions(self, request_count, file_name, row, col):
+        # superseded by newer completion request
+        if request_count != self.completion_request_count:
+            return
+
         if HANDLER.ready():
             HANDLER.textdocument_completion(file_name, row, col)
 
@@ -949,6 +1036,9 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
                 pass
 
     def on_post_save_async(self):
+        # syntax may changed if saved with other extension
+        clear_valid_context(self.view)
+
         # check point in valid source
         if not valid_context(self.view, 0):
             return
@@ -957,14 +1047,19 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
             HANDLER.textdocument_didsave(self.view.file_name())
 
     def on_close(self):
+        is_valid = valid_context(self.view, 0)
+        clear_valid_context(self.view)
+
         # check point in valid source
-        if not valid_context(self.view, 0):
+        if not is_valid:
             return
 
         if HANDLER.ready():
             HANDLER.textdocument_didclose(self.view.file_name())
 
     def on_load(self):
+        clear_valid_context(self.view)
+
         # check point in valid source
         if not valid_context(self.view, 0):
             return
@@ -973,6 +1068,8 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
             HANDLER.textdocument_didopen(self.view.file_name(), reload=True)
 
     def on_reload(self):
+        clear_valid_context(self.view)
+
         # check point in valid source
         if not valid_context(self.view, 0):
             return
@@ -981,6 +1078,8 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
             HANDLER.textdocument_didopen(self.view.file_name(), reload=True)
 
     def on_revert(self):
+        clear_valid_context(self.view)
+
         # check point in valid source
         if not valid_context(self.view, 0):
             return
@@ -988,6 +1087,10 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
         if HANDLER.ready():
             HANDLER.textdocument_didopen(self.view.file_name(), reload=True)
 
+    def on_post_text_command(self, command_name: str, args: dict):
+        if command_name == "set_file_type":
+            clear_valid_context(self.view)
+
 
 class TextChangeListener(sublime_plugin.TextChangeListener):
     def on_text_changed(self, changes: List[sublime.TextChange]):
@@ -1016,9 +1119,12 @@ class TextChangeListener(sublime_plugin.TextChangeListener):
 
 class GotoolsDocumentFormattingCommand(sublime_plugin.TextCommand):
     def run(self, edit: sublime.Edit):
+        if not HANDLER.ready():
+            return
+
         file_name = self.view.file_name()
-        if HANDLER.ready():
-            HANDLER.textdocument_formatting(file_name)
+        # send request from worker thread, keep UI responsive
+        sublime.set_timeout_async(lambda: HANDLER.textdocument_formatting(file_name))
 
     def is_visible(self):
         return valid_context(self.view, 0)
@@ -1026,14 +1132,18 @@ class GotoolsDocumentFormattingCommand(sublime_plugin.TextCommand):
 
 class GotoolsCodeActionCommand(sublime_plugin.TextCommand):
     def run(self, edit: sublime.Edit):
+        if not HANDLER.ready():
+            return
+
         file_name = self.view.file_name()
         cursor = self.view.sel()[0]
-        if HANDLER.ready():
-            start_row, start_col = self.view.rowcol(cursor.a)
-            end_row, end_col = self.view.rowcol(cursor.b)
-            HANDLER.textdocument_codeaction(
+        start_row, start_col = self.view.rowcol(cursor.a)
+        end_row, end_col = self.view.rowcol(cursor.b)
+        sublime.set_timeout_async(
+            lambda: HANDLER.textdocument_codeaction(
                 file_name, start_row, start_col, end_row, end_col
             )
+        )
 
     def is_visible(self):
         return valid_context(self.view, 0)
@@ -1041,12 +1151,15 @@ class GotoolsCodeActionCommand(sublime_plugin.TextCommand):
 
 class GotoolsGotoDefinitionCommand(sublime_plugin.TextCommand):
     def run(self, edit: sublime.Edit, event: Optional[dict] = None):
+        if not HANDLER.ready():
+            return
+
         file_name = self.view.file_name()
-        cursor = self.view.sel()[0]
-        point = event["text_point"] if event else cursor.a
-        if HANDLER.ready():
-            start_row, start_col = self.view.rowcol(point)
-            HANDLER.textdocument_definition(file_name, start_row, start_col)
+        point = event["text_point"] if event else self.view.sel()[0].a
+        start_row, start_col = self.view.rowcol(point)
+        sublime.set_timeout_async(
+            lambda: HANDLER.textdocument_definition(file_name, start_row, start_col)
+        )
 
     def is_visible(self):
         return valid_context(self.view, 0)
@@ -1057,16 +1170,20 @@ class GotoolsGotoDefinitionCommand(sublime_plugin.TextCommand):
 
 class GotoolsRenameCommand(sublime_plugin.TextCommand):
     def run(self, edit: sublime.Edit, event: Optional[dict] = None):
+        if not HANDLER.ready():
+            return
+
         file_name = self.view.file_name()
-        cursor = self.view.sel()[0]
-        point = event["text_point"] if event else cursor.a
-        if HANDLER.ready():
-            # move cursor to point
-            self.view.sel().clear()
-            self.view.sel().add(point)
+        point = event["text_point"] if event else self.view.sel()[0].a
 
-            start_row, start_col = self.view.rowcol(point)
-            HANDLER.textdocument_preparerename(file_name, start_row, start_col)
+        # move cursor to point
+        self.view.sel().clear()
+        self.view.sel().add(point)
+
+        start_row, start_col = self.view.rowcol(point)
+        sublime.set_timeout_async(
+            lambda: HANDLER.textdocument_preparerename(file_name, start_row, start_col)
+        )
 
     def is_visible(self):
         return valid_context(self.view, 0)
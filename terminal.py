@@ -2,28 +2,12 @@
 
 import shlex
 import threading
-from pathlib import Path
-from typing import List
 
 import sublime
 import sublime_plugin
 
 from .api import terminal
-
-
-def get_workspace_path(view: sublime.View) -> str:
-    window = view.window()
-    file_name = view.file_name()
-
-    if folders := [
-        folder for folder in window.folders() if file_name.startswith(folder)
-    ]:
-        return max(folders)
-    return str(Path(file_name).parent)
-
-
-def valid_context(view: sublime.View, point: int):
-    return view.match_selector(point, "source.go")
+from .api.view import get_workspace_path, valid_context
 
 
 class GotoolsShellCommand(sublime_plugin.TextCommand):
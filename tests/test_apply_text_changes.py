@@ -0,0 +1,93 @@
+"""text changes ordering test, run outside Sublime Text with stub modules"""
+
+import importlib
+import sys
+import unittest
+from pathlib import Path
+from types import ModuleType
+from unittest import mock
+
+
+class Region:
+    def __init__(self, a: int, b: int = None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return self.end() - self.begin()
+
+
+def stub_module(name: str, **attrs) -> ModuleType:
+    module = ModuleType(name)
+    module.__dict__.update(attrs)
+    # unused sublime API
+    module.__getattr__ = lambda attr: mock.MagicMock(name=f"{name}.{attr}")
+    return module
+
+
+class Command:
+    def __init__(self, view):
+        self.view = view
+
+
+class View:
+    def __init__(self, text: str):
+        self.text = text
+
+    def replace(self, edit, region: Region, text: str):
+        self.text = self.text[: region.begin()] + text + self.text[region.end() :]
+
+
+def import_gotools():
+    package_path = Path(__file__).resolve().parents[1]
+    sys.path.insert(0, str(package_path.parent))
+
+    modules = {
+        "sublime": stub_module("sublime", Region=Region),
+        "sublime_plugin": stub_module(
+            "sublime_plugin",
+            TextCommand=Command,
+            WindowCommand=Command,
+            ViewEventListener=Command,
+            TextChangeListener=Command,
+        ),
+    }
+    with mock.patch.dict(sys.modules, modules):
+        return importlib.import_module(f"{package_path.name}.gotools")
+
+
+gotools = import_gotools()
+
+
+class TestApplyTextChanges(unittest.TestCase):
+    def apply(self, text: str, changes: list) -> str:
+        view = View(text)
+        command = gotools.GotoolsApplyTextChangesCommand(view)
+        text_changes = [
+            gotools.TextChange(Region(a, b), new_text, len(new_text) - (b - a))
+            for a, b, new_text in changes
+        ]
+        command.apply(None, text_changes)
+        return view.text
+
+    def test_insert_before_replace_at_same_point(self):
+        changes = [(1, 3, "R"), (1, 1, "I")]
+        self.assertEqual(self.apply("abcdef", changes), "aIRdef")
+
+    def test_insert_order_at_same_point(self):
+        changes = [(1, 1, "I"), (1, 1, "J"), (1, 3, "R")]
+        self.assertEqual(self.apply("abcdef", changes), "aIJRdef")
+
+    def test_unordered_changes(self):
+        changes = [(4, 5, "E"), (0, 1, "A")]
+        self.assertEqual(self.apply("abcdef", changes), "AbcdEf")
+
+
+if __name__ == "__main__":
+    unittest.main()